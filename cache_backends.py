@@ -1,9 +1,22 @@
 import asyncio
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import redis.asyncio as redis
-import pickle
+import msgpack
 import time
-from collections import OrderedDict
+import zstandard
+
+from models import ProxyResponse
+
+# Bodies stored in Redis are zstd-compressed when they are textual and large
+# enough for it to pay off; already-compressed media is stored as is.
+_COMPRESSIBLE_TYPES = ("text/", "json", "xml", "javascript")
+_COMPRESS_MIN_SIZE = 512
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+# Reused for every metadata map. pack() resets the buffer after each call and
+# runs synchronously, so sharing it within the event loop is safe.
+_packer = msgpack.Packer(use_bin_type=True)
 
 class BaseCacheBackend:
     async def get(self, key: str) -> Optional[Any]:
@@ -17,59 +30,160 @@ class BaseCacheBackend:
         
     async def exists(self, key: str) -> bool:
         raise NotImplementedError
+        
+    async def clear(self) -> None:
+        raise NotImplementedError
+        
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [await self.get(key) for key in keys]
+        
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300) -> None:
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+            
+    async def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[Optional[Any], Optional[float]]]:
+        """Return each value with its remaining TTL in seconds (None if unbounded or unknown)"""
+        return [(value, None) for value in await self.get_many(keys)]
+
+class _Node:
+    """Entry of the memory cache's LRU list"""
+    __slots__ = ("key", "value", "expiry", "prev", "next")
+    
+    def __init__(self, key: Optional[str] = None, value: Any = None, expiry: float = 0.0):
+        self.key = key
+        self.value = value
+        self.expiry = expiry
+        self.prev: Optional["_Node"] = None
+        self.next: Optional["_Node"] = None
 
 class MemoryCacheBackend(BaseCacheBackend):
     def __init__(self, max_size: int = 1000, default_ttl: int = 300):
-        self._cache = OrderedDict()
+        # Key -> node; nodes are also linked between two sentinels, least
+        # recently used first, so a hit is one dict lookup plus pointer swaps
+        self._cache: Dict[str, _Node] = {}
+        self._head = _Node()
+        self._tail = _Node()
+        self._head.next = self._tail
+        self._tail.prev = self._head
         self.max_size = max_size
         self.default_ttl = default_ttl
         
-    async def get(self, key: str) -> Optional[Any]:
-        if key not in self._cache:
+    def _unlink(self, node: _Node) -> None:
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        
+    def _append(self, node: _Node) -> None:
+        last = self._tail.prev
+        node.prev = last
+        node.next = self._tail
+        last.next = node
+        self._tail.prev = node
+        
+    # Plain synchronous implementations: every operation is in-process dict
+    # work, so CacheManager calls these directly to skip coroutine overhead.
+    # Expiry uses the monotonic clock; lookups accept a `now` the caller has
+    # already read so a request does not hit the clock more than needed.
+    def _get(self, key: str, now: Optional[float] = None) -> Optional[Any]:
+        node = self._cache.get(key)
+        if node is None:
             return None
             
-        data, expiry = self._cache[key]
-        if time.time() > expiry:
-            await self.delete(key)
+        if node.expiry < (time.monotonic() if now is None else now):
+            del self._cache[key]
+            self._unlink(node)
             return None
             
-        # Move to end (most recently used)
-        self._cache.move_to_end(key)
-        return data
+        # Move to end (most recently used), inlined as this is the hit path
+        prev, nxt = node.prev, node.next
+        prev.next = nxt
+        nxt.prev = prev
+        tail = self._tail
+        last = tail.prev
+        node.prev = last
+        node.next = tail
+        last.next = node
+        tail.prev = node
+        return node.value
         
-    async def set(self, key: str, value: Any, ttl: int = None) -> None:
+    def _set(self, key: str, value: Any, ttl: int = None) -> None:
         if ttl is None:
             ttl = self.default_ttl
             
-        expiry = time.time() + ttl
+        # Read the clock here: the upstream fetch may have taken a while
+        expiry = time.monotonic() + ttl
         
-        # Remove if exists to update position
-        if key in self._cache:
-            del self._cache[key]
+        # Sets almost always insert new keys, so insert optimistically: one
+        # dict operation both looks the key up and stores the new node
+        node = _Node(key, value, expiry)
+        existing = self._cache.setdefault(key, node)
+        if existing is not node:
+            # Update in place and detach to move it to the end
+            existing.value = value
+            existing.expiry = expiry
+            self._unlink(existing)
+            self._append(existing)
+            return
             
+        self._append(node)
+        
         # Check size and evict if needed (LRU)
-        if len(self._cache) >= self.max_size:
-            self._cache.popitem(last=False)
-            
-        self._cache[key] = (value, expiry)
+        if len(self._cache) > self.max_size:
+            lru = self._head.next
+            self._unlink(lru)
+            del self._cache[lru.key]
         
-    async def delete(self, key: str) -> None:
-        if key in self._cache:
-            del self._cache[key]
+    def _delete(self, key: str) -> None:
+        node = self._cache.pop(key, None)
+        if node is not None:
+            self._unlink(node)
             
-    async def exists(self, key: str) -> bool:
-        if key not in self._cache:
+    def _exists(self, key: str, now: Optional[float] = None) -> bool:
+        node = self._cache.get(key)
+        if node is None:
             return False
             
-        _, expiry = self._cache[key]
-        if time.time() > expiry:
-            await self.delete(key)
+        if node.expiry < (time.monotonic() if now is None else now):
+            del self._cache[key]
+            self._unlink(node)
             return False
         return True
+        
+    def _clear(self) -> None:
+        self._cache.clear()
+        self._head.next = self._tail
+        self._tail.prev = self._head
+        
+    async def get(self, key: str) -> Optional[Any]:
+        return self._get(key)
+        
+    async def set(self, key: str, value: Any, ttl: int = None) -> None:
+        self._set(key, value, ttl)
+        
+    async def delete(self, key: str) -> None:
+        self._delete(key)
+        
+    async def exists(self, key: str) -> bool:
+        return self._exists(key)
+        
+    async def clear(self) -> None:
+        self._clear()
+        
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self._get(key) for key in keys]
+        
+    async def set_many(self, items: Dict[str, Any], ttl: int = None) -> None:
+        for key, value in items.items():
+            self._set(key, value, ttl)
 
 class RedisCacheBackend(BaseCacheBackend):
-    def __init__(self, redis_url: str):
+    # Keys fetched per SCAN call and deleted per command in clear()
+    CLEAR_BATCH_SIZE = 1000
+    
+    def __init__(self, redis_url: str, key_prefix: str = "proxy:"):
         self.redis_url = redis_url
+        # Namespace for every key this backend writes, so clear() leaves
+        # other data in a shared database alone
+        self.key_prefix = key_prefix
         self._redis: Optional[redis.Redis] = None
         
     async def _get_connection(self) -> redis.Redis:
@@ -77,25 +191,171 @@ class RedisCacheBackend(BaseCacheBackend):
             self._redis = redis.from_url(self.redis_url, encoding="utf-8")
         return self._redis
         
+    def _body_key(self, key: str) -> str:
+        return self.key_prefix + key + ":b"
+        
+    def _meta_key(self, key: str) -> str:
+        return self.key_prefix + key + ":m"
+        
+    @staticmethod
+    def _pack(value: ProxyResponse) -> Tuple[bytes, bytes]:
+        """Return the stored body and metadata for a response"""
+        meta = {
+            "status_code": value.status_code,
+            "headers": value.headers,
+            "from_cache": False,
+            "cache_key": value.cache_key
+        }
+        body = value.content
+        if len(body) >= _COMPRESS_MIN_SIZE:
+            content_type = value.headers.get("content-type", "").lower()
+            if any(t in content_type for t in _COMPRESSIBLE_TYPES):
+                body = _compressor.compress(body)
+                meta["compression"] = "zstd"
+        return body, _packer.pack(meta)
+        
+    @staticmethod
+    def _load(body: Optional[bytes], meta: Optional[bytes]) -> Optional[ProxyResponse]:
+        if body is None or meta is None:
+            return None
+        # Only the small metadata map is decoded; the body is returned as
+        # stored unless the metadata marks it compressed
+        fields = msgpack.unpackb(meta, raw=False)
+        if fields.pop("compression", None) == "zstd":
+            body = _decompressor.decompress(body)
+        return ProxyResponse(content=body, **fields)
+        
     async def get(self, key: str) -> Optional[Any]:
         r = await self._get_connection()
-        data = await r.get(key)
-        if data:
-            return pickle.loads(data)
-        return None
+        # Body and metadata in one round trip
+        body, meta = await r.mget(self._body_key(key), self._meta_key(key))
+        return self._load(body, meta)
         
     async def set(self, key: str, value: Any, ttl: int = 300) -> None:
+        await self.set_many({key: value}, ttl)
+        
+    def _entry_keys(self, keys: List[str]) -> List[str]:
+        redis_keys = []
+        for key in keys:
+            redis_keys += (self._body_key(key), self._meta_key(key))
+        return redis_keys
+        
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
         r = await self._get_connection()
-        data = pickle.dumps(value)
-        await r.setex(key, ttl, data)
+        values = await r.mget(self._entry_keys(keys))
+        return [self._load(*values[i:i + 2]) for i in range(0, len(values), 2)]
+        
+    async def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[Optional[Any], Optional[float]]]:
+        if not keys:
+            return []
+        r = await self._get_connection()
+        # Values and the PTTL of each entry in one round trip
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.mget(self._entry_keys(keys))
+            for key in keys:
+                pipe.pttl(self._meta_key(key))
+            values, *pttls = await pipe.execute()
+            
+        results = []
+        for i, pttl in enumerate(pttls):
+            value = self._load(values[2 * i], values[2 * i + 1])
+            # -1 means no expiry; -2 means the key vanished since the MGET
+            remaining = None if pttl == -1 else max(pttl, 0) / 1000
+            results.append((value, remaining))
+        return results
+        
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300) -> None:
+        r = await self._get_connection()
+        async with r.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                body, meta = self._pack(value)
+                pipe.set(self._body_key(key), body, ex=ttl)
+                pipe.set(self._meta_key(key), meta, ex=ttl)
+            await pipe.execute()
         
     async def delete(self, key: str) -> None:
         r = await self._get_connection()
-        await r.delete(key)
+        await r.delete(self._body_key(key), self._meta_key(key))
         
     async def exists(self, key: str) -> bool:
         r = await self._get_connection()
-        return await r.exists(key) == 1
+        return await r.exists(self._meta_key(key)) == 1
+        
+    async def clear(self) -> None:
+        """Delete every key under this backend's prefix"""
+        r = await self._get_connection()
+        batch = []
+        match = self.key_prefix + "*"
+        async for key in r.scan_iter(match=match, count=self.CLEAR_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= self.CLEAR_BATCH_SIZE:
+                await r.unlink(*batch)
+                batch = []
+        if batch:
+            await r.unlink(*batch)
+
+class TieredCacheBackend(BaseCacheBackend):
+    """Small in-process LRU (L1) in front of a shared backend (L2)
+    
+    Hot keys are served from L1 without a round trip or deserialization.
+    Entries never outlive their L2 copy and live in L1 for at most its own
+    default TTL, which bounds how long a worker can serve an entry deleted
+    in L2 by another worker.
+    """
+    def __init__(self, l1: MemoryCacheBackend, l2: BaseCacheBackend):
+        self.l1 = l1
+        self.l2 = l2
+        
+    def _promote(self, key: str, value: Any, remaining: Optional[float]) -> None:
+        ttl = self.l1.default_ttl
+        if remaining is not None:
+            ttl = min(remaining, ttl)
+        if ttl > 0:
+            self.l1._set(key, value, ttl)
+            
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.l1._get(key)
+        if value is not None:
+            return value
+            
+        (value, remaining), = await self.l2.get_many_with_ttl([key])
+        if value is not None:
+            self._promote(key, value, remaining)
+        return value
+        
+    async def set(self, key: str, value: Any, ttl: int = 300) -> None:
+        await self.l2.set(key, value, ttl)
+        self.l1._set(key, value, min(ttl, self.l1.default_ttl))
+        
+    async def delete(self, key: str) -> None:
+        self.l1._delete(key)
+        await self.l2.delete(key)
+        
+    async def exists(self, key: str) -> bool:
+        return self.l1._exists(key) or await self.l2.exists(key)
+        
+    async def clear(self) -> None:
+        self.l1._clear()
+        await self.l2.clear()
+        
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        values = [self.l1._get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            fetched = await self.l2.get_many_with_ttl([keys[i] for i in missing])
+            for i, (value, remaining) in zip(missing, fetched):
+                if value is not None:
+                    self._promote(keys[i], value, remaining)
+                    values[i] = value
+        return values
+        
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300) -> None:
+        await self.l2.set_many(items, ttl)
+        l1_ttl = min(ttl, self.l1.default_ttl)
+        for key, value in items.items():
+            self.l1._set(key, value, l1_ttl)
 
 class CacheManager:
     def __init__(self, backend: str = "memory", **kwargs):
@@ -110,9 +370,21 @@ class CacheManager:
         elif backend == "redis":
             redis_url = kwargs.get('redis_url', 'redis://localhost:6379')
             self.backend = RedisCacheBackend(redis_url)
+            
+            # Front Redis with a short-lived in-process cache unless disabled
+            l1_size = kwargs.get('l1_max_size', 256)
+            if l1_size > 0:
+                l1 = MemoryCacheBackend(max_size=l1_size, default_ttl=kwargs.get('l1_ttl', 30))
+                self.backend = TieredCacheBackend(l1, self.backend)
         else:
             raise ValueError(f"Unsupported cache backend: {backend}")
             
+        # Synchronous fast path, only available for the in-process backend.
+        # Callers check `is_sync` once and skip awaiting when it is set.
+        self.is_sync = backend == "memory"
+        self.get_sync = self.backend._get if self.is_sync else None
+        self.set_sync = self.backend._set if self.is_sync else None
+            
     async def get(self, key: str) -> Optional[Any]:
         return await self.backend.get(key)
         
@@ -123,4 +395,13 @@ class CacheManager:
         await self.backend.delete(key)
         
     async def exists(self, key: str) -> bool:
-        return await self.backend.exists(key)
\ No newline at end of file
+        return await self.backend.exists(key)
+        
+    async def clear(self) -> None:
+        await self.backend.clear()
+        
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return await self.backend.get_many(keys)
+        
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300) -> None:
+        await self.backend.set_many(items, ttl)
\ No newline at end of file
@@ -8,10 +8,18 @@ class Settings:
         self.port = int(os.getenv("PORT", "8000"))
         self.cache_ttl = int(os.getenv("CACHE_TTL", "300"))
         
+        # Worker processes (0 = one per CPU); reload is for development only
+        self.workers = int(os.getenv("WORKERS", "1")) or os.cpu_count() or 1
+        self.reload = os.getenv("RELOAD", "false").lower() == "true"
+        
         # Cache backend (memory, redis)
         self.cache_backend = os.getenv("CACHE_BACKEND", "memory")
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
         
+        # In-process cache in front of Redis (0 disables it)
+        self.l1_cache_size = int(os.getenv("L1_CACHE_SIZE", "256"))
+        self.l1_cache_ttl = int(os.getenv("L1_CACHE_TTL", "30"))
+        
         # Security
         self.max_cache_size = int(os.getenv("MAX_CACHE_SIZE", "1000"))
         self.allowed_domains = ["*"]
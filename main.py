@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException, Request, Query
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
-import hashlib
+import asyncio
+import blake3
 import json
+import orjson
+import re
 import time
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, asdict
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Optional, Dict, Any, Union
 import gzip
 
 from config import settings
@@ -21,17 +27,28 @@ if settings.cache_backend == "memory":
 elif settings.cache_backend == "redis":
     cache_manager = CacheManager(
         backend="redis",
-        redis_url=settings.redis_url
+        redis_url=settings.redis_url,
+        l1_max_size=settings.l1_cache_size,
+        l1_ttl=settings.l1_cache_ttl
     )
 else:
     raise ValueError(f"Unsupported cache backend: {settings.cache_backend}")
 
+# Resolved once: the memory backend is called synchronously on the hot path
+_cache_is_sync = cache_manager.is_sync
+
 # Statistics
-cache_stats = {
-    "hits": 0,
-    "misses": 0,
-    "total_requests": 0
-}
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    total_requests: int = 0
+
+cache_stats = CacheStats()
+
+# Upstream fetches currently in progress, keyed by cache key. Concurrent
+# misses for the same key await the first fetch instead of repeating it.
+_inflight: Dict[str, asyncio.Future] = {}
 
 app = FastAPI(
     title="Caching Proxy Server",
@@ -39,22 +56,90 @@ app = FastAPI(
     version="1.0.0"
 )
 
+def create_http_client(**kwargs) -> httpx.AsyncClient:
+    """Build the upstream client shared by all proxied requests"""
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        timeout=30.0,
+        # The client serves every user, so it must never store upstream
+        # cookies and replay them on someone else's request
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        **kwargs
+    )
+
+@app.on_event("startup")
+async def startup_http_client():
+    """Create the shared upstream client so connections are pooled across requests"""
+    app.state.http = create_http_client()
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    """Close the shared upstream client"""
+    await app.state.http.aclose()
+
+# Cache keys are hashed from copies of one pristine hasher rather than
+# constructing a new one per request
+_KEY_HASHER = blake3.blake3()
+
+def _hash_key(data: bytes) -> str:
+    hasher = _KEY_HASHER.copy()
+    hasher.update(data)
+    return hasher.hexdigest(16)
+
+def _key_simple(url: str, method: str) -> str:
+    """Cache key for a request without params or body
+    
+    Produces the same key as ``generate_cache_key`` for such requests without
+    building the intermediate field list.
+    """
+    return _hash_key(f"{url}\0{method}\0\0".encode())
+
+def _dumps_canonical(value: Any) -> bytes:
+    """Serialize to JSON with sorted keys, unambiguously for any JSON value"""
+    try:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        # orjson rejects integers beyond 64 bits; the stdlib handles them
+        return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
 def generate_cache_key(request: ProxyRequest) -> str:
     """Generate unique cache key for request"""
-    key_data = {
-        "url": request.url,
-        "method": request.method,
-        "params": request.params or {},
-        "body": request.body
-    }
-    key_string = json.dumps(key_data, sort_keys=True)
-    return hashlib.md5(key_string.encode()).hexdigest()
+    # Common case for plain GETs
+    if not request.params and request.body is None:
+        return _key_simple(request.url, request.method)
+        
+    # Fields are NUL separated; params are JSON with sorted keys, whose
+    # quoting keeps distinct key/value splits from colliding
+    parts = [request.url.encode(), request.method.encode()]
+    parts.append(_dumps_canonical(request.params) if request.params else b"")
+        
+    # Tag the body so a JSON body and an equal-looking string body differ
+    body = request.body
+    if body is None:
+        parts.append(b"")
+    elif isinstance(body, str):
+        parts.append(b"s" + body.encode())
+    else:
+        parts.append(b"j" + _dumps_canonical(body))
+        
+    return _hash_key(b"\0".join(parts))
 
 def is_cacheable_response(status_code: int, headers: Dict[str, str]) -> bool:
     """Check if response should be cached"""
     if status_code not in [200, 301, 302]:
         return False
         
+    # Only cache redirects that are the same for every client
+    if status_code != 200:
+        location = headers.get("location", "")
+        if not location.startswith(("http://", "https://")):
+            return False
+        vary = headers.get("vary", "").strip().lower()
+        if vary not in ("", "accept-encoding"):
+            return False
+        
     # Don't cache responses with certain headers
     cache_control = headers.get("cache-control", "").lower()
     if "no-store" in cache_control or "no-cache" in cache_control:
@@ -62,61 +147,147 @@ def is_cacheable_response(status_code: int, headers: Dict[str, str]) -> bool:
         
     return True
 
-async def make_http_request(request: ProxyRequest) -> ProxyResponse:
-    """Make actual HTTP request to target"""
-    async with httpx.AsyncClient() as client:
-        # Prepare request parameters
-        kwargs = {
-            "method": request.method,
-            "url": request.url,
-            "headers": request.headers or {},
-            "params": request.params or {},
-            "follow_redirects": True
-        }
+async def make_http_request(
+    request: ProxyRequest,
+    stream: bool = False
+) -> Union[ProxyResponse, httpx.Response]:
+    """Make actual HTTP request to target
+    
+    The body is only buffered once the status and headers show the response
+    will be cached. With ``stream=True`` an uncacheable response is returned
+    as the open ``httpx.Response`` instead; the caller must stream and close it.
+    """
+    # Prepare request parameters
+    kwargs = {
+        "method": request.method,
+        "url": request.url,
+        "headers": request.headers or {},
+        "params": request.params or {}
+    }
+    
+    if request.body and request.method in ["POST", "PUT", "PATCH"]:
+        if isinstance(request.body, (dict, list)):
+            kwargs["json"] = request.body
+        else:
+            kwargs["data"] = request.body
         
-        if request.body and request.method in ["POST", "PUT", "PATCH"]:
-            if isinstance(request.body, (dict, list)):
-                kwargs["json"] = request.body
-            else:
-                kwargs["data"] = request.body
-            
-        # Make request
-        response = await client.request(**kwargs)
+    # Make request, reading only the status line and headers for now
+    client = app.state.http
+    response = await client.send(client.build_request(**kwargs), stream=True)
+    
+    if stream and not is_cacheable_response(response.status_code, response.headers):
+        return response
         
-        return ProxyResponse(
-            status_code=response.status_code,
-            content=response.content,
-            headers=dict(response.headers),
-            from_cache=False
-        )
+    try:
+        content = await response.aread()
+    finally:
+        await response.aclose()
+    
+    return ProxyResponse(
+        status_code=response.status_code,
+        content=content,
+        headers=dict(response.headers),
+        from_cache=False
+    )
 
-async def process_proxy_request(request: ProxyRequest, ttl: Optional[int] = None) -> ProxyResponse:
-    """Process proxy request with caching"""
-    cache_stats["total_requests"] += 1
+async def process_proxy_request(
+    request: ProxyRequest,
+    ttl: Optional[int] = None,
+    now: Optional[float] = None,
+    stream: bool = False,
+    cache_key: Optional[str] = None
+) -> Union[ProxyResponse, httpx.Response]:
+    """Process proxy request with caching
+    
+    With ``stream=True`` uncacheable upstream responses are passed back
+    unbuffered, see ``make_http_request``. Callers that already know the
+    cache key may pass it to skip ``generate_cache_key``.
+    """
+    cache_stats.total_requests += 1
+    
+    # Read the clock once per request and share it with the cache
+    if now is None:
+        now = time.monotonic()
     
     # Generate cache key
-    cache_key = generate_cache_key(request)
+    if cache_key is None:
+        cache_key = generate_cache_key(request)
     
     # Check cache
-    cached_response = await cache_manager.get(cache_key)
+    if _cache_is_sync:
+        cached_response = cache_manager.get_sync(cache_key, now)
+    else:
+        cached_response = await cache_manager.get(cache_key)
     if cached_response:
-        cache_stats["hits"] += 1
+        cache_stats.hits += 1
         cached_response.from_cache = True
         cached_response.cache_key = cache_key
         return cached_response
         
-    cache_stats["misses"] += 1
+    cache_stats.misses += 1
     
-    # Make actual request
-    response = await make_http_request(request)
-    response.cache_key = cache_key
-    
-    # Cache if cacheable
-    if is_cacheable_response(response.status_code, response.headers):
-        cache_ttl = ttl or settings.cache_ttl
-        await cache_manager.set(cache_key, response, cache_ttl)
-    
-    return response
+    # Join an identical request that is already being fetched
+    inflight = _inflight.get(cache_key)
+    if inflight is not None:
+        shared = await asyncio.shield(inflight)
+        if shared is not None:
+            return shared
+        # The first request was cancelled or got an uncacheable response
+        # that cannot be shared
+        return await make_http_request(request, stream)
+        
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        # Make actual request
+        response = await make_http_request(request, stream)
+        if isinstance(response, httpx.Response):
+            future.set_result(None)
+            return response
+        response.cache_key = cache_key
+        
+        # Cache if cacheable
+        cacheable = is_cacheable_response(response.status_code, response.headers)
+        if cacheable:
+            cache_ttl = ttl or settings.cache_ttl
+            if _cache_is_sync:
+                cache_manager.set_sync(cache_key, response, cache_ttl)
+            else:
+                await cache_manager.set(cache_key, response, cache_ttl)
+        
+        # Uncacheable responses may be private to this client; waiters sent
+        # their own headers and must fetch for themselves
+        future.set_result(response if cacheable else None)
+        return response
+    except asyncio.CancelledError:
+        # Only this request was cancelled; let waiters fetch for themselves
+        future.set_result(None)
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved in case nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        del _inflight[cache_key]
+
+# orjson parses integers beyond 64 bits as lossy floats. Bodies with a digit
+# run long enough to hold one are parsed exactly by the stdlib instead.
+_LONG_DIGITS_RE = re.compile(rb"\d{19}")
+
+def _loads_json_body(data: bytes) -> Any:
+    """Parse a JSON request body, preserving integers of any size"""
+    if _LONG_DIGITS_RE.search(data):
+        return json.loads(data)
+    return orjson.loads(data)
+
+# Direct proxy paths look like /http/<host>/<path>
+_PROXY_PATH_RE = re.compile(r"/http/(.+)", re.DOTALL)
+
+# Header names are already lowercase in both ASGI and httpx. Request headers
+# are matched on the raw bytes so dropped ones are never decoded.
+_DROP_REQUEST_HEADERS = frozenset({b"host", b"content-length", b"content-encoding", b"accept-encoding"})
+_DROP_RESPONSE_HEADERS = frozenset({"content-encoding", "transfer-encoding", "content-length"})
 
 # Middleware for direct HTTP proxy
 @app.middleware("http")
@@ -124,27 +295,26 @@ async def direct_proxy_middleware(request: Request, call_next):
     """Middleware to handle direct proxy requests"""
     
     # Only process paths starting with /http/
-    if not request.url.path.startswith("/http/"):
+    path_match = _PROXY_PATH_RE.match(request.url.path)
+    if path_match is None:
         return await call_next(request)
     
+    request.state.now = time.monotonic()
+    
     try:
         # Extract the target URL from the path
-        path_parts = request.url.path.split("/http/", 1)
-        if len(path_parts) < 2:
-            raise HTTPException(status_code=400, detail="Invalid proxy path")
-        
-        target_path = path_parts[1]
-        full_url = f"https://{target_path}"
+        full_url = f"https://{path_match.group(1)}"
         
         # Add query parameters if any
         if request.url.query:
             full_url += f"?{request.url.query}"
         
         # Prepare headers - remove headers that shouldn't be forwarded
-        headers = {}
-        for key, value in request.headers.items():
-            if key.lower() not in ['host', 'content-length', 'content-encoding', 'accept-encoding']:
-                headers[key] = value
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in request.headers.raw
+            if key not in _DROP_REQUEST_HEADERS
+        }
         
         # Add our own accept-encoding to control response format
         headers['accept-encoding'] = 'identity'  # Request uncompressed content
@@ -163,20 +333,37 @@ async def direct_proxy_middleware(request: Request, call_next):
                 content_type = request.headers.get("content-type", "")
                 if "application/json" in content_type:
                     try:
-                        proxy_request_data.body = json.loads(body_bytes.decode())
-                    except:
+                        proxy_request_data.body = _loads_json_body(body_bytes)
+                    except ValueError:
                         proxy_request_data.body = body_bytes.decode()
                 else:
                     proxy_request_data.body = body_bytes.decode()
         
+        # Direct proxy requests never carry params, so without a body the
+        # key depends on the URL and method alone
+        cache_key = None
+        if proxy_request_data.body is None:
+            cache_key = _key_simple(full_url, request.method)
+        
         # Process the proxy request
-        response_data = await process_proxy_request(proxy_request_data)
+        response_data = await process_proxy_request(
+            proxy_request_data, now=request.state.now, stream=True, cache_key=cache_key
+        )
         
         # Prepare response headers - remove encoding headers that might cause issues
-        response_headers = {}
-        for key, value in response_data.headers.items():
-            if key.lower() not in ['content-encoding', 'transfer-encoding', 'content-length']:
-                response_headers[key] = value
+        response_headers = {
+            key: value for key, value in response_data.headers.items()
+            if key not in _DROP_RESPONSE_HEADERS
+        }
+        
+        # Uncacheable responses are relayed chunk by chunk as they arrive
+        if isinstance(response_data, httpx.Response):
+            return StreamingResponse(
+                response_data.aiter_bytes(65536),
+                status_code=response_data.status_code,
+                headers=response_headers,
+                background=BackgroundTask(response_data.aclose)
+            )
         
         # Return the response
         return Response(
@@ -211,28 +398,28 @@ async def get_cache_info(cache_key: str):
         "from_cache": cached_item.from_cache
     }
 
+# Registered before /cache/{cache_key} so "clear" is not taken as a key
+@app.delete("/cache/clear")
+async def clear_cache():
+    """Clear all cache"""
+    await cache_manager.clear()
+    return {"message": "Cache cleared"}
+
 @app.delete("/cache/{cache_key}")
 async def delete_cache_item(cache_key: str):
     """Delete specific cache item"""
     await cache_manager.delete(cache_key)
     return {"message": f"Cache item {cache_key} deleted"}
 
-@app.delete("/cache/clear")
-async def clear_cache():
-    """Clear all cache"""
-    if settings.cache_backend == "memory":
-        cache_manager.backend._cache.clear()
-    return {"message": "Cache cleared"}
-
 @app.get("/stats")
 async def get_stats():
     """Get cache statistics"""
-    total = cache_stats["total_requests"]
-    hits = cache_stats["hits"]
+    total = cache_stats.total_requests
+    hits = cache_stats.hits
     hit_rate = (hits / total * 100) if total > 0 else 0
     
     return {
-        **cache_stats,
+        **asdict(cache_stats),
         "hit_rate": round(hit_rate, 2),
         "cache_backend": settings.cache_backend
     }
@@ -248,9 +435,21 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
+    
+    if settings.workers > 1 and settings.cache_backend == "memory":
+        print(
+            f"Warning: running {settings.workers} workers with the memory cache backend; "
+            "each worker keeps its own cache and statistics. Use CACHE_BACKEND=redis "
+            "to share the cache between workers."
+        )
+    
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
-        reload=True
+        # "auto" picks uvloop and httptools when installed (not on Windows)
+        loop="auto",
+        http="auto",
+        workers=settings.workers,
+        reload=settings.reload
     )
\ No newline at end of file
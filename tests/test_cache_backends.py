@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import fakeredis
+
+from cache_backends import MemoryCacheBackend, RedisCacheBackend, TieredCacheBackend
+from models import ProxyResponse
+
+
+def make_redis_backend():
+    backend = RedisCacheBackend("redis://localhost:6379")
+    backend._redis = fakeredis.FakeAsyncRedis()
+    return backend
+
+
+def make_response(content=b"ok"):
+    return ProxyResponse(status_code=200, content=content, headers={"content-type": "text/plain"})
+
+
+def test_tiered_l1_does_not_outlive_redis_entry():
+    async def scenario():
+        redis_backend = make_redis_backend()
+        tiered = TieredCacheBackend(MemoryCacheBackend(max_size=10, default_ttl=30), redis_backend)
+        await redis_backend.set("k", make_response(), ttl=1)
+        
+        # Promoted into L1 from Redis with about a second left
+        assert (await tiered.get("k")).content == b"ok"
+        await asyncio.sleep(1.1)
+        
+        assert await redis_backend.get("k") is None
+        assert await tiered.get("k") is None
+        
+    asyncio.run(scenario())
+
+
+def test_redis_round_trip_with_compression():
+    async def scenario():
+        backend = make_redis_backend()
+        body = b"hello world " * 100
+        await backend.set("k", make_response(body), ttl=60)
+        
+        cached = await backend.get("k")
+        assert cached.content == body
+        assert cached.status_code == 200
+        
+    asyncio.run(scenario())
+
+
+def test_redis_clear_keeps_foreign_keys():
+    async def scenario():
+        backend = make_redis_backend()
+        await backend._redis.set("other", b"keep me")
+        await backend.set("k", make_response(), ttl=60)
+        
+        await backend.clear()
+        
+        assert await backend.get("k") is None
+        assert await backend._redis.get("other") == b"keep me"
+        
+    asyncio.run(scenario())
+
+
+def lru_order(cache):
+    keys = []
+    node = cache._head.next
+    while node is not cache._tail:
+        assert node.next.prev is node
+        keys.append(node.key)
+        node = node.next
+    assert sorted(keys) == sorted(cache._cache)
+    return keys
+
+
+def test_memory_evicts_least_recently_used():
+    cache = MemoryCacheBackend(max_size=3, default_ttl=60)
+    for key in "abc":
+        cache._set(key, key)
+    assert cache._get("a") == "a"
+    
+    cache._set("d", "d")
+    
+    assert cache._get("b") is None
+    assert lru_order(cache) == ["c", "a", "d"]
+
+
+def test_memory_update_existing_key_moves_it_to_the_end():
+    cache = MemoryCacheBackend(max_size=2, default_ttl=60)
+    cache._set("a", 1)
+    cache._set("b", 2)
+    cache._set("a", 3)
+    cache._set("c", 4)
+    
+    assert cache._get("a") == 3
+    assert cache._get("b") is None
+    assert lru_order(cache) == ["c", "a"]
+
+
+def test_memory_expired_entries_are_removed():
+    cache = MemoryCacheBackend(max_size=10, default_ttl=60)
+    cache._set("a", 1)
+    cache._set("b", 2)
+    later = time.monotonic() + 120
+    
+    assert cache._get("a", later) is None
+    assert not cache._exists("b", later)
+    assert cache._cache == {}
+    assert lru_order(cache) == []
+
+
+def test_memory_delete_and_clear_relink_the_list():
+    cache = MemoryCacheBackend(max_size=10, default_ttl=60)
+    for key in "abc":
+        cache._set(key, key)
+        
+    cache._delete("b")
+    cache._delete("missing")
+    assert lru_order(cache) == ["a", "c"]
+    
+    cache._clear()
+    assert cache._head.next is cache._tail
+    assert cache._tail.prev is cache._head
+    assert lru_order(cache) == []
+    
+    cache._set("d", "d")
+    assert cache._get("d") == "d"
+    assert lru_order(cache) == ["d"]
+
+
+def test_redis_clear_removes_every_cached_entry():
+    async def scenario():
+        backend = make_redis_backend()
+        await backend.set_many({"a": make_response(b"a"), "b": make_response(b"b")}, ttl=60)
+        assert [v.content for v in await backend.get_many(["a", "b"])] == [b"a", b"b"]
+        
+        await backend.clear()
+        
+        assert await backend.get_many(["a", "b"]) == [None, None]
+        assert not await backend.exists("a")
+        assert await backend._redis.keys("*") == []
+        
+    asyncio.run(scenario())
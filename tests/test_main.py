@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+
+import main
+from models import ProxyRequest, ProxyResponse
+
+
+def test_cancelled_leader_does_not_cancel_waiters(monkeypatch):
+    calls = []
+    
+    async def fake_make_http_request(request, stream=False):
+        calls.append(request.url)
+        if len(calls) == 1:
+            # The first fetch hangs until its request is cancelled
+            await asyncio.Event().wait()
+        return ProxyResponse(status_code=200, content=b"ok", headers={})
+        
+    monkeypatch.setattr(main, "make_http_request", fake_make_http_request)
+    
+    async def scenario():
+        request = ProxyRequest(url="https://example.com/cancel")
+        leader = asyncio.create_task(main.process_proxy_request(request))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(main.process_proxy_request(request))
+        await asyncio.sleep(0)
+        
+        leader.cancel()
+        response = await waiter
+        
+        assert leader.cancelled()
+        assert response.content == b"ok"
+        assert main._inflight == {}
+        
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_cache_key_accepts_json_body_with_big_integer():
+    request = ProxyRequest(url="https://example.com/", method="POST", body={"n": 2**70})
+    other = ProxyRequest(url="https://example.com/", method="POST", body={"n": 2**70 + 1})
+    
+    assert main.generate_cache_key(request) != main.generate_cache_key(other)
+
+
+def test_json_body_parse_keeps_big_integers():
+    assert main._loads_json_body(b'{"n": 1180591620717411303424}') == {"n": 2**70}
+    assert main._loads_json_body(b'{"n": 1}') == {"n": 1}
+
+
+def test_uncacheable_response_is_not_shared_with_waiters(monkeypatch):
+    calls = []
+    release = None
+    
+    async def fake_make_http_request(request, stream=False):
+        calls.append(request.headers)
+        if len(calls) == 1:
+            await release.wait()
+        return ProxyResponse(
+            status_code=200,
+            content=request.headers["authorization"].encode(),
+            headers={"cache-control": "no-store"}
+        )
+        
+    monkeypatch.setattr(main, "make_http_request", fake_make_http_request)
+    
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        first = ProxyRequest(url="https://example.com/private", headers={"authorization": "userA"})
+        second = ProxyRequest(url="https://example.com/private", headers={"authorization": "userB"})
+        leader = asyncio.create_task(main.process_proxy_request(first))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(main.process_proxy_request(second))
+        await asyncio.sleep(0)
+        
+        release.set()
+        assert (await leader).content == b"userA"
+        assert (await waiter).content == b"userB"
+        
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_upstream_cookies_are_not_replayed_to_other_clients():
+    sent_cookies = []
+    
+    def handler(request):
+        sent_cookies.append(request.headers.get("cookie"))
+        return httpx.Response(200, headers={"set-cookie": "session=userA; Path=/"})
+        
+    async def scenario():
+        async with main.create_http_client(transport=httpx.MockTransport(handler)) as client:
+            await client.get("https://example.com/login")
+            await client.get("https://example.com/")
+            
+    asyncio.run(scenario())
+    assert sent_cookies == [None, None]
+
+
+def test_cache_key_params_do_not_collide():
+    def key(params):
+        return main.generate_cache_key(ProxyRequest(url="https://example.com/", params=params))
+        
+    assert key({"a": "b=c"}) != key({"a=b": "c"})
+    assert key({"a": "1\x1fb=2"}) != key({"a": "1", "b": "2"})
+    assert key({"a": "1", "b": "2"}) == key({"b": "2", "a": "1"})